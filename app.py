@@ -2,10 +2,15 @@
 # /// script
 # requires-python = ">=3.11"
 # dependencies = [
+#     "cachetools",
 #     "fastapi",
+#     "numpy",
+#     "orjson",
 #     "uvicorn",
 #     "pydantic",
-#     "pyxorfilter",
+#     "pyxorfilter==1.1.2",
+#     "watchfiles",
+#     "xxhash<4",
 # ]
 # ///
 """
@@ -15,24 +20,32 @@ Usage:
     uv run app.py
 
 The app will:
-- Load all XOR filters from the filters/ directory
+- Find all XOR filters in the filters/ directory and load each one on first use
 - Serve them at /router/{uuid} endpoints
-- Support checking if text is in the filter
+- Support checking if text is in the filter, one text or a batch at a time
+- Watch the filters/ directory and pick up added, changed or removed filter files
 - Provide a /reload endpoint to reload filters
 """
 
-import json
+import asyncio
+import mmap
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
-from typing import Dict
+from typing import Dict, MutableMapping, Optional, Tuple
 
+import orjson
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from cachetools import LFUCache, LRUCache
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
+from watchfiles import Change, awatch
 
 # Add current directory to path to import our custom xor_filter module
 sys.path.insert(0, str(Path(__file__).parent))
-from xor_filter import SimpleXorFilter
+from xor_filter import FILE_SUFFIX, SimpleXorFilter, unpack_file_header
 
 
 class QueryRequest(BaseModel):
@@ -47,6 +60,17 @@ class QueryResponse(BaseModel):
     text: str
 
 
+class BatchQueryRequest(BaseModel):
+    """Request model for querying the XOR filter with several texts at once."""
+    texts: list[str]
+
+
+class BatchQueryResponse(BaseModel):
+    """Response model for batch XOR filter queries."""
+    found: list[bool]
+    uuid: str
+
+
 class ReloadResponse(BaseModel):
     """Response model for reload endpoint."""
     status: str
@@ -54,80 +78,345 @@ class ReloadResponse(BaseModel):
     filter_uuids: list[str]
 
 
+def json_response(payload: dict) -> Response:
+    """
+    Serialize a response body with orjson.
+
+    Hot endpoints return this directly so FastAPI skips jsonable_encoder and
+    response model validation. The Pydantic response models are still attached
+    via ``responses=`` so they keep documenting the schema in OpenAPI.
+    """
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+
+# Longer texts are queried directly rather than cached, to bound the cache's memory
+MAX_CACHED_TEXT_LENGTH = 256
+
+
 class XORFilterApp:
-    """Application class to manage XOR filters."""
+    """
+    Application class to manage XOR filters.
 
-    def __init__(self, filters_dir: Path = Path("filters")):
+    Filter files are scanned up front, but each filter is only deserialized the
+    first time it is queried. Loaded filters are kept in a bounded LRU cache, so
+    memory use follows the working set rather than the number of files on disk.
+
+    Query results for short texts are cached per (uuid, text) in an LFU cache,
+    so frequently repeated queries skip hashing and probing the filter.
+    """
+
+    def __init__(self, filters_dir: Path = Path("filters"), max_loaded_filters: int = 256,
+                 query_cache_size: int = 16384):
         self.filters_dir = filters_dir
-        self.filters: Dict[str, SimpleXorFilter] = {}
+        self.filters: MutableMapping[str, SimpleXorFilter] = LRUCache(maxsize=max_loaded_filters)
+        self.query_cache: MutableMapping[Tuple[str, str], bool] = LFUCache(maxsize=query_cache_size)
+        self.filter_paths: Dict[str, Path] = {}
         self.filter_metadata: Dict[str, dict] = {}
+        # Queries run in the threadpool and LRUCache reorders itself on every read
+        self._lock = threading.Lock()
         self.load_filters()
 
     def load_filters(self):
-        """Load all XOR filter JSON files from the filters directory."""
-        self.filters.clear()
-        self.filter_metadata.clear()
+        """
+        Scan the filters directory for .xorf (and legacy .json) filter files.
+
+        Only .xorf headers are read here (legacy .json files are parsed for their
+        metadata); filters are deserialized on first query.
+        Previously loaded filters are dropped so the next query picks up changes.
+        """
+        filter_paths: Dict[str, Path] = {}
+        filter_metadata: Dict[str, dict] = {}
 
         if not self.filters_dir.exists():
             print(f"Warning: Filters directory '{self.filters_dir}' does not exist")
             self.filters_dir.mkdir(exist_ok=True)
-            return
 
-        json_files = list(self.filters_dir.glob("*.json"))
+        # Legacy JSON files first, so a .xorf file for the same UUID takes precedence
+        filter_files = sorted(self.filters_dir.glob("*.json")) + sorted(self.filters_dir.glob(f"*{FILE_SUFFIX}"))
 
-        if not json_files:
+        if not filter_files:
             print(f"Warning: No filter files found in '{self.filters_dir}'")
-            return
 
-        for json_file in json_files:
-            try:
-                with open(json_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+        # Files are independent and scanning is mostly I/O, so read them concurrently.
+        # map() preserves input order, which keeps the .xorf-over-.json precedence.
+        with ThreadPoolExecutor() as executor:
+            results = list(executor.map(self._try_scan_file, filter_files))
+
+        for filter_file, scanned, error in results:
+            if error is not None:
+                print(f"Error reading filter from {filter_file}: {error}")
+                continue
+
+            filter_uuid, metadata = scanned
+            filter_paths[filter_uuid] = filter_file
+            filter_metadata[filter_uuid] = metadata
+
+            print(f"Found filter {filter_uuid} ({metadata.get('num_entries') or 0} entries)")
+
+        # Swap in the new mappings whole so concurrent readers never see a partial scan
+        self.filter_paths = filter_paths
+        self.filter_metadata = filter_metadata
+        with self._lock:
+            self.filters.clear()
+            self.query_cache.clear()
+
+        print(f"Total filters available: {len(self.filter_paths)}")
+
+    @classmethod
+    def _try_scan_file(cls, path: Path) -> Tuple[Path, Optional[Tuple[str, dict]], Optional[Exception]]:
+        """Scan one file for the thread pool, returning the error instead of raising it."""
+        try:
+            return path, cls._scan_file(path), None
+        except Exception as e:
+            return path, None, e
+
+    @staticmethod
+    def _scan_file(path: Path) -> Tuple[str, dict]:
+        """Read a filter's UUID and metadata without deserializing the filter."""
+        if path.suffix == FILE_SUFFIX:
+            # Mapping the file only faults in the pages the header touches
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                header, _ = unpack_file_header(mm)
+            return header["uuid"], {
+                "source_file": header["source_file"],
+                "num_entries": header["num_entries"],
+            }
+
+        # Legacy JSON keeps metadata next to the payload, so it has to be parsed
+        data = orjson.loads(path.read_bytes())
+        return data["uuid"], {
+            "source_file": data.get("source_file"),
+            "num_entries": data.get("num_entries"),
+        }
+
+    def _load_one(self, uuid: str, path: Path) -> SimpleXorFilter:
+        """Deserialize a single filter from disk."""
+        if path.suffix == FILE_SUFFIX:
+            _, xor_filter, metadata = self._load_binary_file(path)
+        else:
+            _, xor_filter, metadata = self._load_json_file(path)
+
+        print(f"Loaded filter {uuid} ({metadata.get('num_entries') or 0} entries)")
+
+        return xor_filter
+
+    @staticmethod
+    def _load_binary_file(path: Path) -> Tuple[str, SimpleXorFilter, dict]:
+        """Load a filter from a .xorf file by memory-mapping it."""
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header, offset = unpack_file_header(mm)
+            # Slice a memoryview rather than the mmap itself to avoid copying the payload
+            with memoryview(mm)[offset:] as payload:
+                xor_filter = SimpleXorFilter.from_buffer(payload, header["num_items"], header["filter_type"])
+
+        metadata = {
+            "source_file": header["source_file"],
+            "num_entries": header["num_entries"],
+        }
+        return header["uuid"], xor_filter, metadata
+
+    @staticmethod
+    def _load_json_file(path: Path) -> Tuple[str, SimpleXorFilter, dict]:
+        """Load a filter from a legacy JSON file with a base64 encoded payload."""
+        data = orjson.loads(path.read_bytes())
+
+        # Reconstruct the XOR filter from the saved data
+        xor_filter = SimpleXorFilter.from_dict(data["filter_data"])
+
+        metadata = {
+            "source_file": data.get("source_file"),
+            "num_entries": data.get("num_entries"),
+        }
+        return data["uuid"], xor_filter, metadata
 
-                filter_uuid = data["uuid"]
-                filter_data = data["filter_data"]
+    def query_filter(self, uuid: str, text: str) -> bool:
+        """
+        Query a filter to check if text is present.
 
-                # Reconstruct the XOR filter from the saved data
-                xor_filter = SimpleXorFilter.from_dict(filter_data)
+        Args:
+            uuid: UUID of the filter
+            text: Text to check
 
-                self.filters[filter_uuid] = xor_filter
-                self.filter_metadata[filter_uuid] = {
-                    "source_file": data.get("source_file"),
-                    "num_entries": data.get("num_entries"),
-                }
+        Returns:
+            True if text is in the filter, False otherwise
+        """
+        if len(text) > MAX_CACHED_TEXT_LENGTH:
+            return text in self.get_filter(uuid)
 
-                print(f"Loaded filter {filter_uuid} ({data.get('num_entries', 0)} entries)")
+        key = (uuid, text)
+        with self._lock:
+            found = self.query_cache.get(key)
+        if found is not None:
+            return found
 
-            except Exception as e:
-                print(f"Error loading filter from {json_file}: {e}")
+        xor_filter = self.get_filter(uuid)
+        found = text in xor_filter
+        with self._lock:
+            if self._is_current(uuid, xor_filter):
+                self.query_cache[key] = found
 
-        print(f"Total filters loaded: {len(self.filters)}")
+        return found
 
-    def query_filter(self, uuid: str, text: str) -> bool:
+    def query_filter_many(self, uuid: str, texts: list[str]) -> list[bool]:
         """
-        Query a filter to check if text is present.
+        Query a filter with a batch of texts.
 
         Args:
             uuid: UUID of the filter
-            text: Text to check
+            texts: Texts to check
 
         Returns:
-            True if text is in the filter, False otherwise
+            One membership result per text, in the same order
+        """
+        xor_filter = self.get_filter(uuid)
+
+        with self._lock:
+            found = [
+                self.query_cache.get((uuid, text)) if len(text) <= MAX_CACHED_TEXT_LENGTH else None
+                for text in texts
+            ]
+
+        misses = [i for i, result in enumerate(found) if result is None]
+        if misses:
+            results = xor_filter.contains_many([texts[i] for i in misses])
+            with self._lock:
+                cache_results = self._is_current(uuid, xor_filter)
+                for i, result in zip(misses, results):
+                    found[i] = result
+                    if cache_results and len(texts[i]) <= MAX_CACHED_TEXT_LENGTH:
+                        self.query_cache[(uuid, texts[i])] = result
+
+        return found
+
+    def _is_current(self, uuid: str, xor_filter: SimpleXorFilter) -> bool:
+        """
+        Check, with the lock held, that a probed filter is still the cached one.
+
+        Reloads and file changes drop the filter from the LRU under the same
+        lock that clears its results, so a result from a filter that is no
+        longer cached may be stale and must not be written back.
         """
-        if uuid not in self.filters:
+        return self.filters.get(uuid) is xor_filter
+
+    def get_filter(self, uuid: str) -> SimpleXorFilter:
+        """
+        Look up a filter by UUID, loading it from disk on a cache miss.
+
+        Raises:
+            HTTPException: 404 if no filter with that UUID exists
+        """
+        with self._lock:
+            xor_filter = self.filters.get(uuid)
+        if xor_filter is not None:
+            return xor_filter
+
+        path = self.filter_paths.get(uuid)
+        if path is None:
             raise HTTPException(status_code=404, detail=f"Filter with UUID '{uuid}' not found")
 
-        return text in self.filters[uuid]
+        # Load outside the lock so a large filter doesn't stall queries on cached ones
+        try:
+            xor_filter = self._load_one(uuid, path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Filter with UUID '{uuid}' not found")
+
+        with self._lock:
+            # A reload or file change during the load replaces the path object;
+            # don't put the now-stale filter back into the cache in that case
+            if self.filter_paths.get(uuid) is path:
+                self.filters[uuid] = xor_filter
+
+        return xor_filter
+
+    async def watch(self):
+        """
+        Apply changes to the filters directory one file at a time.
+
+        Runs on the event loop. Files are scanned in a worker thread, but the
+        path and metadata dicts are only mutated here, so the async endpoints
+        that iterate them never see a change mid-iteration.
+        """
+        filters_dir = self.filters_dir.resolve()
+        async for changes in awatch(filters_dir, recursive=False):
+            for change, changed in changes:
+                path = filters_dir / Path(changed).name
+                if path.suffix not in (FILE_SUFFIX, ".json"):
+                    continue
+
+                if change == Change.deleted:
+                    if not self._remove_filter_file(path):
+                        continue
+                    # Fall back to the other format for the same UUID, if it's still on disk
+                    sibling = path.with_suffix(".json" if path.suffix == FILE_SUFFIX else FILE_SUFFIX)
+                    if not sibling.exists():
+                        continue
+                    path = sibling
+
+                try:
+                    filter_uuid, metadata = await asyncio.to_thread(self._scan_file, path)
+                except Exception as e:
+                    # A file still being written fails here and is retried on its next change
+                    print(f"Error reading filter from {path}: {e}")
+                    continue
+
+                self._update_filter_file(path, filter_uuid, metadata)
+
+    def _update_filter_file(self, path: Path, filter_uuid: str, metadata: dict):
+        """Register a new or changed filter file and drop any stale loaded copy."""
+        current = self.filter_paths.get(filter_uuid)
+        if (current is not None and current.suffix == FILE_SUFFIX
+                and path.suffix != FILE_SUFFIX and current.exists()):
+            # A .xorf file takes precedence over legacy JSON for the same UUID
+            return
+
+        self.filter_paths[filter_uuid] = path
+        self.filter_metadata[filter_uuid] = metadata
+        self._evict(filter_uuid)
+
+        print(f"Updated filter {filter_uuid} from {path.name}")
+
+    def _remove_filter_file(self, path: Path) -> bool:
+        """Forget the filter that was stored in a deleted file, returning whether one was."""
+        removed = False
+        for filter_uuid, filter_path in list(self.filter_paths.items()):
+            if filter_path.name == path.name:
+                del self.filter_paths[filter_uuid]
+                self.filter_metadata.pop(filter_uuid, None)
+                self._evict(filter_uuid)
+                removed = True
+
+                print(f"Removed filter {filter_uuid}")
+
+        return removed
+
+    def _evict(self, uuid: str):
+        """Drop a filter and its cached query results so the next query reloads it."""
+        with self._lock:
+            self.filters.pop(uuid, None)
+            for key in [key for key in self.query_cache if key[0] == uuid]:
+                del self.query_cache[key]
 
 
 # Initialize the filter app
 filter_app = XORFilterApp()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Watch the filters directory for as long as the app is running."""
+    watcher = asyncio.create_task(filter_app.watch())
+    yield
+    watcher.cancel()
+    with suppress(asyncio.CancelledError):
+        await watcher
+
+
 # Create FastAPI app
 app = FastAPI(
     title="XOR Filter Service",
     description="API for querying XOR filters",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -136,13 +425,13 @@ async def root():
     """Root endpoint with service information."""
     return {
         "service": "XOR Filter Service",
-        "filters_loaded": len(filter_app.filters),
-        "filter_uuids": list(filter_app.filters.keys())
+        "filters_loaded": len(filter_app.filter_paths),
+        "filter_uuids": list(filter_app.filter_paths.keys())
     }
 
 
-@app.post("/router/{uuid}", response_model=QueryResponse)
-async def query_filter(uuid: str, request: QueryRequest):
+@app.post("/router/{uuid}", responses={200: {"model": QueryResponse}})
+def query_filter(uuid: str, request: QueryRequest):
     """
     Query a XOR filter to check if text is present.
 
@@ -155,35 +444,56 @@ async def query_filter(uuid: str, request: QueryRequest):
     """
     found = filter_app.query_filter(uuid, request.text)
 
-    return QueryResponse(
-        found=found,
-        uuid=uuid,
-        text=request.text
-    )
+    return json_response({
+        "found": found,
+        "uuid": uuid,
+        "text": request.text
+    })
+
+
+@app.post("/router/{uuid}/batch", responses={200: {"model": BatchQueryResponse}})
+def query_filter_batch(uuid: str, request: BatchQueryRequest):
+    """
+    Query a XOR filter with several texts in a single request.
+
+    Args:
+        uuid: UUID of the filter
+        request: Batch query request containing the texts to check
+
+    Returns:
+        BatchQueryResponse with one result per text, in request order
+    """
+    found = filter_app.query_filter_many(uuid, request.texts)
 
+    return json_response({
+        "found": found,
+        "uuid": uuid
+    })
 
-@app.post("/reload", response_model=ReloadResponse)
-async def reload_filters():
+
+@app.post("/reload", responses={200: {"model": ReloadResponse}})
+def reload_filters():
     """
-    Reload all XOR filters from the filters directory.
+    Rescan the filters directory and drop all loaded filters.
 
     This allows you to pick up new or updated filter files without restarting the server.
+    Filters are loaded again on their next query.
 
     Returns:
         ReloadResponse with reload status
     """
     filter_app.load_filters()
 
-    return ReloadResponse(
-        status="success",
-        filters_loaded=len(filter_app.filters),
-        filter_uuids=list(filter_app.filters.keys())
-    )
+    return json_response({
+        "status": "success",
+        "filters_loaded": len(filter_app.filter_paths),
+        "filter_uuids": list(filter_app.filter_paths.keys())
+    })
 
 
 @app.get("/filters")
 async def list_filters():
-    """List all loaded filters with their metadata."""
+    """List all available filters with their metadata."""
     filters_info = []
     for uuid, metadata in filter_app.filter_metadata.items():
         filters_info.append({
@@ -198,7 +508,17 @@ async def list_filters():
 
 
 def main():
-    """Run the FastAPI application."""
+    """
+    Run the FastAPI application in a single worker process.
+
+    Query and reload handlers are plain ``def`` functions, so FastAPI runs them
+    in its threadpool and the event loop stays free for other requests. To
+    scale across cores, run several worker processes instead:
+
+        uvicorn app:app --host 0.0.0.0 --port 8000 --workers N
+
+    Each worker loads its own copy of the filters.
+    """
     print("Starting XOR Filter Service...")
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
@@ -46,11 +46,17 @@ curl -s -X POST http://localhost:8000/router/$UUID \
     -d '{"text": "pineapple"}' | python3 -m json.tool
 echo ""
 
-echo "6. Listing all filters..."
+echo "6. Testing batch query (apple, banana found; coconut NOT found)..."
+curl -s -X POST http://localhost:8000/router/$UUID/batch \
+    -H "Content-Type: application/json" \
+    -d '{"texts": ["apple", "banana", "coconut"]}' | python3 -m json.tool
+echo ""
+
+echo "7. Listing all filters..."
 curl -s http://localhost:8000/filters | python3 -m json.tool
 echo ""
 
-echo "7. Testing reload endpoint..."
+echo "8. Testing reload endpoint..."
 curl -s -X POST http://localhost:8000/reload | python3 -m json.tool
 echo ""
 
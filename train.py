@@ -2,27 +2,33 @@
 # /// script
 # requires-python = ">=3.11"
 # dependencies = [
-#     "pyxorfilter",
+#     "numpy",
+#     "pyxorfilter==1.1.2",
+#     "xxhash<4",
 # ]
 # ///
 """
 Training script for XOR filters.
 
 Usage:
-    uv run train.py <input_file.txt>
+    uv run train.py <input_file.txt> [<input_file.txt> ...]
 
-This will create a JSON file with the XOR filter in the filters/ directory.
+This will create a binary <uuid>.xorf file with the XOR filter in the filters/ directory
+for each input file. A file that fails to build is reported and skipped.
 """
 
 import argparse
-import json
+import os
 import sys
+import tempfile
 import uuid
 from pathlib import Path
 
+import numpy as np
+
 # Add current directory to path to import our custom xor_filter module
 sys.path.insert(0, str(Path(__file__).parent))
-from xor_filter import SimpleXorFilter
+from xor_filter import FILE_SUFFIX, SimpleXorFilter, hash_key, pack_file_header
 
 
 def build_xor_filter(input_file: Path, output_dir: Path = Path("filters")):
@@ -31,60 +37,75 @@ def build_xor_filter(input_file: Path, output_dir: Path = Path("filters")):
 
     Args:
         input_file: Path to the input text file
-        output_dir: Directory to save the filter JSON files
+        output_dir: Directory to save the filter files
     """
     # Create output directory if it doesn't exist
     output_dir.mkdir(exist_ok=True)
 
-    # Read all lines from the input file
+    # Stream the input straight into an array of 64-bit keys, so only
+    # 8 bytes per line are held in memory rather than every line's text
     with open(input_file, "r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip()]
+        stripped = (line.strip() for line in f)
+        keys = np.fromiter((hash_key(line) for line in stripped if line), dtype=np.uint64)
 
-    if not lines:
+    num_entries = len(keys)
+    if not num_entries:
         print(f"Error: No data found in {input_file}")
         return
 
-    print(f"Building XOR filter with {len(lines)} entries...")
+    print(f"Building XOR filter with {num_entries} entries...")
 
-    # Build the XOR filter
-    xor_filter = SimpleXorFilter(lines)
+    # Build the XOR filter (from_keys drops duplicate keys)
+    xor_filter = SimpleXorFilter.from_keys(keys)
 
     # Generate a UUID for this filter
     filter_uuid = str(uuid.uuid4())
 
-    # Serialize the filter
-    filter_data = {
-        "uuid": filter_uuid,
-        "source_file": str(input_file),
-        "num_entries": len(lines),
-        "filter_data": xor_filter.to_dict()
-    }
-
-    # Save to JSON file
-    output_file = output_dir / f"{filter_uuid}.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(filter_data, f, indent=2)
+    # Save as header + raw filter bytes so the app can mmap it. Write to a temp
+    # file first so the app's scan and watcher never see a partially written filter.
+    output_file = output_dir / f"{filter_uuid}{FILE_SUFFIX}"
+    payload = xor_filter.to_bytes()
+    fd, tmp_name = tempfile.mkstemp(dir=output_dir, prefix=f".{filter_uuid}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pack_file_header(filter_uuid, xor_filter, num_entries, str(input_file), len(payload)))
+            f.write(payload)
+        os.replace(tmp_name, output_file)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
 
     print(f"XOR filter created successfully!")
     print(f"UUID: {filter_uuid}")
     print(f"Output file: {output_file}")
-    print(f"Entries: {len(lines)}")
+    print(f"Entries: {num_entries}")
+    print(f"Filter type: {xor_filter.filter_type}")
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Build XOR filter from text file")
-    parser.add_argument("input_file", type=Path, help="Input text file (one entry per line)")
+    parser = argparse.ArgumentParser(description="Build XOR filters from text files")
+    parser.add_argument("input_files", type=Path, nargs="+",
+                       help="Input text files (one entry per line), one filter per file")
     parser.add_argument("--output-dir", type=Path, default=Path("filters"),
-                       help="Output directory for filter JSON files (default: filters/)")
+                       help="Output directory for filter files (default: filters/)")
 
     args = parser.parse_args()
 
-    if not args.input_file.exists():
-        print(f"Error: Input file '{args.input_file}' does not exist")
-        return 1
-
-    build_xor_filter(args.input_file, args.output_dir)
-    return 0
+    failed = 0
+    for input_file in args.input_files:
+        if not input_file.exists():
+            print(f"Error: Input file '{input_file}' does not exist")
+            failed += 1
+            continue
+
+        # Keep going so one bad input doesn't abort a batch of filters
+        try:
+            build_xor_filter(input_file, args.output_dir)
+        except ValueError as e:
+            print(f"Error: Could not build filter from '{input_file}': {e}")
+            failed += 1
+
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
@@ -4,39 +4,167 @@ XOR Filter implementation using pyxorfilter.
 A XOR filter is a probabilistic data structure for approximate membership queries.
 This implementation uses the pyxorfilter library which provides efficient C-based
 XOR filters that are faster and smaller than Bloom filters.
+
+Xor8 stores an 8-bit fingerprint per slot, which gives a false positive rate of
+about 1/256 (~0.4%) at ~9.84 bits per entry. There are no false negatives.
+
+Keys are always deduplicated before construction: neither C populate handles
+duplicates (Xor8 fails, Fuse8 silently drops a key). With distinct keys, Xor8
+construction already retries up to 100 hash seeds internally, so it essentially
+never fails. As a guard against that unlikely case, the filter falls back to
+Fuse8 (a binary fuse filter with the same 8-bit fingerprints and false positive
+rate) and records that choice as its ``filter_type``.
+
+Filters are stored on disk as ``<uuid>.xorf`` files: a fixed little-endian
+header (see ``FILE_HEADER``), the UTF-8 encoded source file name, and then the
+raw ``serialize()`` bytes of the filter. The payload is not base64 encoded, so
+it can be mapped into memory and handed straight to ``deserialize``.
 """
 
 import base64
-from typing import List
+import struct
+import uuid
+from typing import Callable, Iterable, List, Tuple
+
+import numpy as np
 
 try:
-    from pyxorfilter import Xor8
+    import xxhash
 except ImportError:
-    raise ImportError("pyxorfilter is required. Install with: pip install pyxorfilter")
+    raise ImportError("xxhash is required. Install with: pip install 'xxhash<4'")
+
+try:
+    from pyxorfilter import Fuse8, Xor8
+    from pyxorfilter._xorfilter import ffi, lib
+except ImportError:
+    raise ImportError("pyxorfilter is required. Install with: pip install pyxorfilter==1.1.2")
+
+
+FILE_SUFFIX = ".xorf"
+FILE_MAGIC = b"XORF"
+# magic, uuid bytes, num_items, num_entries, filter type, source file name length, payload length
+FILE_HEADER = struct.Struct("<4s16sQQ8sHQ")
+
+# Filter types in the order construction tries them
+FILTER_TYPES = {"Xor8": Xor8, "Fuse8": Fuse8}
+
+
+def hash_key(item: str) -> int:
+    """
+    Hash an item to the 64-bit key Xor8 stores for it.
+
+    This is the same xxh64 digest pyxorfilter computes inside ``populate`` and
+    ``contains``, so filters built from these keys answer string queries.
+
+    This relies on pyxorfilter internals (its seedless ``xxh64(str(item))``
+    hashing, ``_xorfilter.lib`` and the name-mangled filter attributes), which
+    is why the scripts pin ``pyxorfilter==1.1.2``. Do not lift the pin without
+    checking these still match: a changed hash would make newly trained filters
+    return false negatives for every string query.
+    """
+    return xxhash.xxh64_intdigest(item.encode("utf-8"))
+
+
+def _filter_class(filter_type: str):
+    """Return the pyxorfilter class for a stored filter type name."""
+    if filter_type not in FILTER_TYPES:
+        raise ValueError(f"Unsupported filter type '{filter_type}'")
+    return FILTER_TYPES[filter_type]
+
+
+def _populate_keys(xor_filter, keys) -> bool:
+    """Populate a pyxorfilter filter from a cffi array of pre-hashed keys."""
+    # The wrappers only accept items they hash themselves, so call the C populate directly
+    if isinstance(xor_filter, Xor8):
+        return lib.xor8_buffered_populate(keys, len(keys), xor_filter._Xor8__filter)
+    return lib.binary_fuse8_populate(keys, len(keys), xor_filter._Fuse8__filter)
 
 
 class SimpleXorFilter:
     """
-    A wrapper around pyxorfilter's Xor8 implementation.
+    A wrapper around pyxorfilter's Xor8 implementation (Fuse8 as a fallback).
 
     This provides a real XOR filter implementation that is faster and more
-    space-efficient than Bloom filters (~9 bits per entry).
+    space-efficient than Bloom filters (~9 bits per entry, ~0.4% false positives).
     """
 
-    def __init__(self, items: List[str]):
+    def __init__(self, items: Iterable[str]):
         """
         Initialize the XOR filter with a list of items.
 
         Args:
-            items: List of strings to add to the filter
+            items: Strings to add to the filter (any iterable; duplicates are fine)
+        """
+        # Hash into a flat array (deduplicated in _populate) instead of
+        # building a set of the strings themselves
+        keys = np.fromiter((hash_key(item) for item in items), dtype=np.uint64)
+        self._populate(keys)
+
+    @classmethod
+    def from_keys(cls, keys) -> "SimpleXorFilter":
+        """
+        Build the filter from pre-hashed keys instead of strings.
+
+        This skips materializing the input strings, which is what makes
+        streaming large training files possible.
+
+        Args:
+            keys: Array of uint64 keys from ``hash_key``; duplicates are dropped
+
+        Returns:
+            A populated SimpleXorFilter instance
+        """
+        instance = cls.__new__(cls)
+        instance._populate(keys)
+        return instance
+
+    def _populate(self, keys) -> None:
+        """Build the underlying filter from uint64 keys; the keys are not kept."""
+        # Neither C populate handles duplicates (Xor8 fails, Fuse8 drops a key),
+        # so dedup here, before counting, whatever the caller passed in
+        keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        self.num_items = len(keys)
+
+        if not self.num_items:
+            # Xor8 reports failure when populated with no keys, but an
+            # unpopulated Xor8 is a valid empty filter that round-trips
+            self.filter_type, self.filter = "Xor8", Xor8(0)
+            return
+
+        def populate(xor_filter) -> bool:
+            # The C populate rewrites the key buffer when it fails, so every
+            # attempt gets a fresh C copy (still no Python list of keys)
+            key_array = ffi.new("uint64_t[]", self.num_items)
+            ffi.memmove(key_array, keys, ffi.sizeof(key_array))
+            return _populate_keys(xor_filter, key_array)
+
+        self.filter_type, self.filter = self._build(self.num_items, populate)
+
+    @staticmethod
+    def _build(num_items: int, populate: Callable[[object], bool]) -> Tuple[str, object]:
+        """
+        Construct a filter as Xor8, falling back to Fuse8 if that fails.
+
+        Xor8 already retries many seeds in C, so there is no retry loop here;
+        the fallback only guards against that extremely unlikely failure.
+
+        Args:
+            num_items: Number of distinct items the filter will hold
+            populate: Populates a freshly allocated filter, returning success
+
+        Returns:
+            A tuple of (filter type name, populated pyxorfilter filter)
+
+        Raises:
+            ValueError: If every filter type failed
         """
-        self.items_set = set(items)  # Store items for serialization
-        self.num_items = len(self.items_set)
+        for filter_type, filter_class in FILTER_TYPES.items():
+            xor_filter = filter_class(num_items)
+            if populate(xor_filter):
+                return filter_type, xor_filter
+            print(f"Warning: {filter_type} construction failed")
 
-        # Create and populate the Xor8 filter
-        self.filter = Xor8(self.num_items)
-        if not self.filter.populate(list(self.items_set)):
-            raise ValueError("Failed to populate XOR filter")
+        raise ValueError("Failed to populate XOR filter")
 
     def __contains__(self, item: str) -> bool:
         """
@@ -51,23 +179,33 @@ class SimpleXorFilter:
         """
         return self.filter.contains(item)
 
+    def contains_many(self, items: List[str]) -> List[bool]:
+        """
+        Check a batch of items against the filter.
+
+        Args:
+            items: The items to check
+
+        Returns:
+            A list with one membership result per item, in the same order
+        """
+        contains = self.filter.contains
+        return [contains(item) for item in items]
+
     def to_dict(self) -> dict:
         """
         Serialize the filter to a dictionary.
 
         Returns:
-            Dictionary representation of the filter (includes items for cross-language compatibility)
+            Dictionary representation of the filter
         """
         # Serialize the filter to bytes and encode as base64 for JSON compatibility
         serialized = self.filter.serialize()
-        # Store both the binary filter AND items for cross-language compatibility
-        # This allows other implementations (e.g., Go) to rebuild the filter
         return {
             "num_items": self.num_items,
-            "filter_type": "Xor8",
+            "filter_type": self.filter_type,
             "size_bytes": self.filter.size_in_bytes(),
             "data": base64.b64encode(serialized).decode('ascii'),
-            "items": list(self.items_set)  # Include items for Go compatibility
         }
 
     @classmethod
@@ -84,11 +222,45 @@ class SimpleXorFilter:
         # Create a new instance and deserialize the filter
         instance = cls.__new__(cls)
         instance.num_items = data["num_items"]
-        instance.items_set = set(data.get("items", []))  # Load items if available
+        # Older files also carry an "items" list; it is not needed to query the filter
+
+        # Files written before the Fuse8 fallback existed are always Xor8
+        instance.filter_type = data.get("filter_type", "Xor8")
 
         # Decode the base64 data and deserialize
         filter_bytes = base64.b64decode(data["data"])
-        instance.filter = Xor8.deserialize(filter_bytes)
+        instance.filter = _filter_class(instance.filter_type).deserialize(filter_bytes)
+
+        return instance
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the filter to its raw binary representation.
+
+        Returns:
+            The filter's pyxorfilter serialization, without any framing or encoding
+        """
+        return bytes(self.filter.serialize())
+
+    @classmethod
+    def from_buffer(cls, buffer, num_items: int, filter_type: str = "Xor8") -> "SimpleXorFilter":
+        """
+        Deserialize a filter from raw bytes produced by ``to_bytes``.
+
+        Args:
+            buffer: Any object supporting the buffer protocol (bytes, memoryview, mmap)
+            num_items: Number of distinct items the filter was built from
+            filter_type: The ``filter_type`` the filter was built as
+
+        Returns:
+            Reconstructed SimpleXorFilter instance
+        """
+        instance = cls.__new__(cls)
+        instance.num_items = num_items
+        instance.filter_type = filter_type
+
+        # deserialize copies the fingerprints, so the buffer may be released afterwards
+        instance.filter = _filter_class(filter_type).deserialize(buffer)
 
         return instance
 
@@ -97,4 +269,75 @@ class SimpleXorFilter:
         return self.num_items
 
     def __repr__(self) -> str:
-        return f"SimpleXorFilter(items={self.num_items}, size_bytes={self.filter.size_in_bytes()})"
+        return (f"SimpleXorFilter(items={self.num_items}, type={self.filter_type}, "
+                f"size_bytes={self.filter.size_in_bytes()})")
+
+
+def pack_file_header(filter_uuid: str, xor_filter: SimpleXorFilter,
+                     num_entries: int, source_file: str, payload_len: int) -> bytes:
+    """
+    Build the header that precedes the filter payload in a ``.xorf`` file.
+
+    Args:
+        filter_uuid: UUID of the filter
+        xor_filter: The filter being written
+        num_entries: Number of input lines the filter was built from
+        source_file: Path of the input file, recorded for /filters
+        payload_len: Length of the ``to_bytes()`` payload that follows
+
+    Returns:
+        Header bytes followed by the encoded source file name
+    """
+    source = source_file.encode("utf-8")
+    header = FILE_HEADER.pack(
+        FILE_MAGIC,
+        uuid.UUID(filter_uuid).bytes,
+        xor_filter.num_items,
+        num_entries,
+        xor_filter.filter_type.encode("ascii"),
+        len(source),
+        payload_len,
+    )
+    return header + source
+
+
+def unpack_file_header(buffer) -> Tuple[dict, int]:
+    """
+    Parse the header of a ``.xorf`` file.
+
+    Args:
+        buffer: The file contents (bytes, memoryview or mmap)
+
+    Returns:
+        A tuple of (header fields, offset of the filter payload)
+
+    Raises:
+        ValueError: If the buffer is not a supported filter file, or is truncated
+    """
+    if len(buffer) < FILE_HEADER.size:
+        raise ValueError("File is too short to be a filter file")
+
+    magic, uuid_bytes, num_items, num_entries, filter_type, source_len, payload_len = \
+        FILE_HEADER.unpack_from(buffer)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"Bad magic {magic!r}, not a filter file")
+
+    filter_type = filter_type.rstrip(b"\0").decode("ascii")
+    _filter_class(filter_type)  # reject unknown types before touching the payload
+
+    # deserialize trusts the lengths embedded in the payload, so a short file
+    # would read past the end of the mapping; reject it here instead
+    offset = FILE_HEADER.size + source_len
+    if offset > len(buffer):
+        raise ValueError("File is truncated inside the source file name")
+    if len(buffer) - offset != payload_len:
+        raise ValueError(f"Payload is {len(buffer) - offset} bytes, expected {payload_len}")
+
+    header = {
+        "uuid": str(uuid.UUID(bytes=uuid_bytes)),
+        "num_items": num_items,
+        "num_entries": num_entries,
+        "filter_type": filter_type,
+        "source_file": bytes(buffer[FILE_HEADER.size:offset]).decode("utf-8"),
+    }
+    return header, offset